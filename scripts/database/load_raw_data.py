@@ -1,87 +1,225 @@
 import os
-import json
+import io
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from datetime import datetime
+import ijson
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from loguru import logger
 from dotenv import load_dotenv
 
 load_dotenv()
 
+COLUMNS = ('id', 'date', 'message', 'views', 'has_media', 'channel', 'image_path')
+NULL = r'\N'  # COPY text-format null marker; escaping keeps it out of real values
+ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+BATCH_ROWS = 100_000  # Rows per COPY transaction
+MAX_CONNECTIONS = 8  # Pooled connections, one per concurrently loading file
+PAGE_SIZE = 1000  # Rows per INSERT statement when COPY is unavailable
+
+def read_messages(file_path):
+    """Stream a JSON message dump as COPY rows without loading the whole array"""
+    with open(file_path, 'rb') as f:
+        for message in ijson.items(f, 'item', use_float=True):
+            yield (
+                message['id'],
+                message['date'],
+                message['message'],
+                message['views'],
+                message['has_media'],
+                message['channel'],
+                message.get('image_path')
+            )
+
+def copy_field(value):
+    """Encode one value for COPY text format; only None becomes the null marker"""
+    if value is None:
+        return NULL
+    return str(value).translate(ESCAPES)
+
+class CopyStream:
+    """File-like object that encodes rows lazily for COPY FROM STDIN (text format)"""
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+        self.buf = io.StringIO()
+    
+    def read(self, size=-1):
+        while size < 0 or self.buf.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buf.write('\t'.join(map(copy_field, row)))
+            self.buf.write('\n')
+            self.count += 1
+        
+        data = self.buf.getvalue()
+        if size < 0:
+            size = len(data)
+        self.buf.seek(0)
+        self.buf.truncate()
+        self.buf.write(data[size:])
+        return data[:size]
+
 class RawDataLoader:
     def __init__(self):
-        self.conn = psycopg2.connect(
+        # Every connection stays pooled (minconn == maxconn) so each keeps its
+        # prepared stage table; psycopg2 closes connections returned above minconn
+        self.pool = ThreadedConnectionPool(
+            minconn=MAX_CONNECTIONS,
+            maxconn=MAX_CONNECTIONS,
             dbname=os.getenv('POSTGRES_DB'),
             user=os.getenv('POSTGRES_USER'),
             password=os.getenv('POSTGRES_PASSWORD'),
             host=os.getenv('POSTGRES_HOST'),
             port=os.getenv('POSTGRES_PORT')
         )
-        self.cur = self.conn.cursor()
+        self.prepared = set()  # Connections whose session holds the stage table and merge_stage
         self.setup_database()
     
     def setup_database(self):
         """Create raw schema and tables if they don't exist"""
-        self.cur.execute("""
-            CREATE SCHEMA IF NOT EXISTS raw;
+        conns = [self.pool.getconn() for _ in range(MAX_CONNECTIONS)]
+        try:
+            with conns[0].cursor() as cur:
+                cur.execute("""
+                    CREATE SCHEMA IF NOT EXISTS raw;
+                    
+                    CREATE TABLE IF NOT EXISTS raw.telegram_messages (
+                        id BIGINT PRIMARY KEY,
+                        date TIMESTAMP WITH TIME ZONE,
+                        message TEXT,
+                        views INTEGER,
+                        has_media BOOLEAN,
+                        channel VARCHAR(255),
+                        image_path VARCHAR(255),
+                        scraped_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                    );
+                """)
+            conns[0].commit()
+            
+            # Probe the COPY path once on one session; restricted roles and
+            # transaction-mode poolers reject TEMP tables, PREPARE or COPY
+            try:
+                self.prepare_session(conns[0])
+                with conns[0].cursor() as cur:
+                    self.copy_rows(cur, [])
+                conns[0].rollback()
+                self.use_copy = True
+            except psycopg2.Error as e:
+                conns[0].rollback()
+                logger.warning(f"COPY unavailable, falling back to multi-row INSERT: {e}")
+                self.use_copy = False
             
-            CREATE TABLE IF NOT EXISTS raw.telegram_messages (
-                id BIGINT PRIMARY KEY,
-                date TIMESTAMP WITH TIME ZONE,
-                message TEXT,
-                views INTEGER,
-                has_media BOOLEAN,
-                channel VARCHAR(255),
-                image_path VARCHAR(255),
-                scraped_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-            );
-        """)
-        self.conn.commit()
+            if self.use_copy:
+                for conn in conns[1:]:
+                    self.prepare_session(conn)
+        
+        finally:
+            for conn in conns:
+                self.pool.putconn(conn)
+    
+    def prepare_session(self, conn):
+        """Create the session-lived stage table and merge statement, planned once"""
+        columns = ', '.join(COLUMNS)
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS telegram_messages_stage
+                (LIKE raw.telegram_messages INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS;
+                
+                PREPARE merge_stage AS
+                INSERT INTO raw.telegram_messages ({columns})
+                SELECT DISTINCT ON (id) {columns}
+                FROM telegram_messages_stage
+                ON CONFLICT (id) DO NOTHING;
+            """)
+        conn.commit()
+        self.prepared.add(conn)
     
     def load_data(self, file_path):
         """Load JSON data from file into database"""
+        conn = self.pool.getconn()
+        rows = read_messages(file_path)
         try:
-            with open(file_path) as f:
-                data = json.load(f)
+            # The pool replaces dropped connections with fresh, unprepared sessions
+            if self.use_copy and conn not in self.prepared:
+                self.prepare_session(conn)
             
-            channel = os.path.basename(file_path).replace('.json', '')
-            
-            for message in data:
-                self.cur.execute("""
-                    INSERT INTO raw.telegram_messages 
-                    (id, date, message, views, has_media, channel, image_path)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO NOTHING;
-                """, (
-                    message['id'],
-                    message['date'],
-                    message['message'],
-                    message['views'],
-                    message['has_media'],
-                    message['channel'],
-                    message.get('image_path')
-                ))
-            
-            self.conn.commit()
-            logger.success(f"Loaded {len(data)} messages from {file_path}")
+            total = 0
+            with conn.cursor() as cur:
+                while True:
+                    count = self.write_rows(cur, islice(rows, BATCH_ROWS))
+                    conn.commit()
+                    total += count
+                    if count < BATCH_ROWS:
+                        break
+            logger.success(f"Loaded {total} messages from {file_path}")
             return True
         
         except Exception as e:
-            self.conn.rollback()
+            if not conn.closed:
+                conn.rollback()
             logger.error(f"Error loading {file_path}: {str(e)}")
             return False
+        
+        finally:
+            rows.close()
+            if conn.closed:
+                self.prepared.discard(conn)
+            self.pool.putconn(conn)
+    
+    def write_rows(self, cur, rows):
+        """Write rows with COPY when available, multi-row INSERT otherwise"""
+        if self.use_copy:
+            return self.copy_rows(cur, rows)
+        return self.insert_rows(cur, rows)
+    
+    def copy_rows(self, cur, rows):
+        """Bulk load rows through a staging table with a single COPY"""
+        stream = CopyStream(rows)
+        columns = ', '.join(COLUMNS)
+        cur.copy_expert(
+            f"COPY telegram_messages_stage ({columns}) FROM STDIN WITH (FORMAT text, NULL '{NULL}')",
+            stream
+        )
+        cur.execute("EXECUTE merge_stage;")
+        return stream.count
+    
+    def insert_rows(self, cur, rows):
+        """Insert rows as paged multi-row VALUES statements"""
+        rows = list(rows)
+        execute_values(
+            cur,
+            f"""
+                INSERT INTO raw.telegram_messages ({', '.join(COLUMNS)})
+                VALUES %s
+                ON CONFLICT (id) DO NOTHING;
+            """,
+            rows,
+            page_size=PAGE_SIZE
+        )
+        return len(rows)
     
     def process_directory(self, directory):
-        """Process all JSON files in a directory"""
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if file.endswith('.json'):
-                    file_path = os.path.join(root, file)
-                    self.load_data(file_path)
+        """Load all JSON files in a directory in parallel, one connection per file"""
+        files = [
+            os.path.join(root, file)
+            for root, _, names in os.walk(directory)
+            for file in names
+            if file.endswith('.json')
+        ]
+        with ThreadPoolExecutor(max_workers=MAX_CONNECTIONS) as executor:
+            results = list(executor.map(self.load_data, files))
+        
+        logger.info(f"Loaded {sum(results)}/{len(files)} files from {directory}")
+        return all(results)
     
     def close(self):
-        self.cur.close()
-        self.conn.close()
+        self.pool.closeall()
 
 if __name__ == '__main__':
     loader = RawDataLoader()
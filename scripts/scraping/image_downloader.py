@@ -1,16 +1,24 @@
 import os
+import io
+import csv
 import asyncio
-from datetime import datetime
-from typing import List, Optional, Dict
-from dataclasses import dataclass
+import struct
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, astuple
 from pathlib import Path
 import hashlib
 import aiofiles
 from telethon import TelegramClient, events
-from telethon.tl.types import MessageMediaPhoto
+from telethon.tl.types import (
+    MessageMediaPhoto,
+    PhotoSize,
+    PhotoCachedSize,
+    PhotoSizeProgressive
+)
 from loguru import logger
-from PIL import Image
-import imagehash
+import psycopg2
 import cv2
 import numpy as np
 from dotenv import load_dotenv
@@ -18,9 +26,131 @@ from dotenv import load_dotenv
 # Configuration
 load_dotenv()
 IMAGE_QUALITY = 85  # JPEG quality (1-100)
-DEDUPE_THRESHOLD = 5  # Hash difference threshold
+JPEG_PARAMS = [  # Baseline, single-pass Huffman encoding
+    int(cv2.IMWRITE_JPEG_QUALITY), IMAGE_QUALITY,
+    int(cv2.IMWRITE_JPEG_OPTIMIZE), 0,
+    int(cv2.IMWRITE_JPEG_PROGRESSIVE), 0
+]
+DEDUPE_THRESHOLD = 5  # Max Hamming distance between duplicate pHashes
 MIN_WIDTH = 100  # Minimum image width in pixels
 MIN_HEIGHT = 100  # Minimum image height in pixels
+USE_CUDA = os.getenv('IMAGE_USE_CUDA', '0') == '1'  # Opt-in GPU enhancement
+MAX_CONCURRENT_DOWNLOADS = 4  # Downloads in flight across all channels
+HASH_FLUSH_EVERY = 128  # Hashes buffered before flushing image_hashes.bin
+METADATA_BATCH = 500  # Image metadata rows per COPY
+METADATA_FLUSH_SECONDS = 5  # Max wait before a partial metadata batch is written
+PHOTO_SIZE_TYPES = (PhotoSize, PhotoCachedSize, PhotoSizeProgressive)  # Sizes with real dimensions
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Count set bits of every element in a uint64 array"""
+    if hasattr(np, 'bitwise_count'):  # NumPy 2.0+, maps to POPCNT/VPOPCNTQ
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+# First 8 rows of the unnormalised 32-point DCT-II basis (scipy's default, which
+# imagehash uses); pHash only ever reads the 8x8 low-frequency block
+_DCT_BASIS = (2 * np.cos(np.pi * np.arange(8)[:, None] * (2 * np.arange(32) + 1) / 64)).astype(np.float32)
+
+def _phash(gray: np.ndarray) -> int:
+    """64-bit DCT perceptual hash of a grayscale image, in imagehash.phash bit order"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    # Two small float32 GEMMs compute just the 64 coefficients needed
+    low = _DCT_BASIS @ small @ _DCT_BASIS.T
+    bits = low > np.median(low)
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+# CLAHE (Contrast Limited Adaptive Histogram Equalization), built once per process
+_CLAHE = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+_CLAHE_GPU = None
+
+def _gpu_clahe():
+    """Build the CUDA CLAHE on first use in this process, None without a device"""
+    global _CLAHE_GPU
+    if _CLAHE_GPU is None:
+        _CLAHE_GPU = False
+        try:
+            if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+                _CLAHE_GPU = cv2.cuda.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        except (AttributeError, cv2.error) as e:
+            logger.warning(f"CUDA enhancement unavailable, using CPU: {e}")
+    return _CLAHE_GPU or None
+
+def _enhance_image_gpu(img: np.ndarray, clahe) -> np.ndarray:
+    """CUDA variant of _enhance_image; results differ slightly from the CPU path"""
+    gpu = cv2.cuda_GpuMat()
+    gpu.upload(img)
+    lab = cv2.cuda.cvtColor(gpu, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.cuda.split(lab)
+    l = clahe.apply(l, cv2.cuda_Stream.Null())
+    lab = cv2.cuda.merge([l, a, b])
+    return cv2.cuda.cvtColor(lab, cv2.COLOR_LAB2BGR).download()
+
+def _enhance_image(img: np.ndarray) -> np.ndarray:
+    """Apply basic image enhancement"""
+    if USE_CUDA:
+        clahe = _gpu_clahe()
+        if clahe is not None:
+            return _enhance_image_gpu(img, clahe)
+    
+    # Convert to LAB color space for better contrast enhancement
+    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    
+    # Equalize the L channel in place instead of splitting and merging planes
+    lab[:, :, 0] = _CLAHE.apply(lab[:, :, 0])
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+def _cpu_pipeline(raw: bytes) -> Tuple[bytes, int, int]:
+    """Decode, enhance and re-encode an image; runs in a worker process"""
+    img = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Image decoding failed")
+    img = _enhance_image(img)
+    ok, encoded = cv2.imencode('.jpg', img, JPEG_PARAMS)
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return encoded.tobytes(), img.shape[1], img.shape[0]
+
+class HashIndex:
+    """Contiguous uint64 store of perceptual hashes with vectorized Hamming search"""
+    def __init__(self, capacity: int = 1024):
+        self.hashes = np.empty(capacity, dtype=np.uint64)
+        self.size = 0
+        self.exact = set()  # O(1) check for re-posted identical images
+
+    def extend(self, values: np.ndarray):
+        """Append hashes, growing the backing array geometrically"""
+        needed = self.size + len(values)
+        if needed > len(self.hashes):
+            grown = np.empty(max(needed, 2 * len(self.hashes)), dtype=np.uint64)
+            grown[:self.size] = self.hashes[:self.size]
+            self.hashes = grown
+        self.hashes[self.size:needed] = values
+        self.size = needed
+        self.exact.update(np.asarray(values, dtype=np.uint64).tolist())
+
+    def add(self, value: int):
+        """Append a single hash"""
+        self.extend(np.array([value], dtype=np.uint64))
+
+    def discard(self, value: int):
+        """Remove the most recent occurrence of a hash, e.g. a reservation that failed"""
+        matches = np.flatnonzero(self.hashes[:self.size] == np.uint64(value))
+        if not len(matches):
+            return
+        idx = matches[-1]
+        self.hashes[idx:self.size - 1] = self.hashes[idx + 1:self.size]
+        self.size -= 1
+        if len(matches) == 1:
+            self.exact.discard(value)
+
+    def find(self, value: int, max_distance: int) -> bool:
+        """Check whether any stored hash lies within max_distance bits"""
+        if value in self.exact:
+            return True
+        if not self.size:
+            return False
+        distances = _popcount(self.hashes[:self.size] ^ np.uint64(value))
+        return bool((distances <= max_distance).any())
 
 @dataclass
 class DownloadedImage:
@@ -40,101 +170,235 @@ class AdvancedImageDownloader:
             os.getenv('TELEGRAM_API_HASH'))
         self.download_dir = Path('data/processed/images')
         self.download_dir.mkdir(parents=True, exist_ok=True)
-        self.processed_hashes = set()
+        self.hash_file = self.download_dir / 'image_hashes.bin'
+        self.processed_hashes = HashIndex()
         self._load_existing_hashes()
+        self._hash_fp = open(self.hash_file, 'ab')
+        self._unflushed_hashes = 0
+        self.process_pool = ProcessPoolExecutor()
+        if 'libjpeg-turbo' not in cv2.getBuildInformation():
+            logger.warning("OpenCV is not built against libjpeg-turbo; JPEG encoding will be slow")
 
     def _load_existing_hashes(self):
         """Load existing image hashes to prevent duplicates"""
-        hash_file = self.download_dir / 'image_hashes.txt'
-        if hash_file.exists():
-            with open(hash_file) as f:
-                self.processed_hashes.update(line.strip() for line in f)
+        legacy_file = self.download_dir / 'image_hashes.txt'
+        if not self.hash_file.exists() and legacy_file.exists():
+            # One-off migration from the hex-per-line format
+            with open(legacy_file) as f:
+                legacy = [int(line, 16) for line in f if line.strip()]
+            np.array(legacy, dtype='<u8').tofile(str(self.hash_file))
+        if self.hash_file.exists():
+            self.processed_hashes.extend(np.fromfile(str(self.hash_file), dtype='<u8'))
 
-    def _save_hash(self, img_hash: str):
-        """Save new image hash to prevent future duplicates"""
-        with open(self.download_dir / 'image_hashes.txt', 'a') as f:
-            f.write(f"{img_hash}\n")
-        self.processed_hashes.add(img_hash)
+    def _save_hash(self, img_hash: int):
+        """Persist an image hash already reserved in the in-memory index"""
+        self._hash_fp.write(struct.pack('<Q', img_hash))
+        self._unflushed_hashes += 1
+        if self._unflushed_hashes >= HASH_FLUSH_EVERY:
+            self._hash_fp.flush()
+            self._unflushed_hashes = 0
 
     async def _download_image(self, message, channel: str) -> Optional[DownloadedImage]:
         """Download and process a single image"""
+        reserved = None
         try:
             file_path = self.download_dir / f"{channel}_{message.id}.jpg"
+            sizes = [s for s in message.photo.sizes if isinstance(s, PHOTO_SIZE_TYPES)]
+            if not sizes:
+                return None
             
-            # Download original image
-            await message.download_media(file=str(file_path))
-            
-            # Image processing pipeline
-            img = Image.open(file_path)
+            # 1. Check minimum dimensions from the photo metadata
+            largest = max(sizes, key=lambda s: s.w * s.h)
+            if largest.w < MIN_WIDTH or largest.h < MIN_HEIGHT:
+                return None
             
-            # 1. Check minimum dimensions
-            if img.width < MIN_WIDTH or img.height < MIN_HEIGHT:
-                file_path.unlink()
+            # 2. Deduplication with perceptual hashing on the smallest thumbnail,
+            # so duplicates never cost a full-resolution download
+            thumb = min(sizes, key=lambda s: s.w * s.h)
+            thumb_bytes = await self.client.download_media(message, file=bytes, thumb=thumb)
+            # JPEG stores luma directly, so decoding as grayscale skips color conversion
+            phash = _phash(cv2.imdecode(np.frombuffer(thumb_bytes, np.uint8), cv2.IMREAD_GRAYSCALE))
+            if self.processed_hashes.find(phash, DEDUPE_THRESHOLD):
                 return None
             
-            # 2. Deduplication with perceptual hashing
-            phash = str(imagehash.phash(img))
-            for existing_hash in self.processed_hashes:
-                if abs(int(phash, 16) - int(existing_hash, 16)) < DEDUPE_THRESHOLD:
-                    file_path.unlink()
-                    return None
+            # Reserve the hash now so a cross-post downloading concurrently
+            # in another channel is caught while this one is still in flight
+            self.processed_hashes.add(phash)
+            reserved = phash
+            
+            # 3. Download original image into memory
+            raw = await message.download_media(file=bytes)
             
-            # 3. Optimize image
-            img = cv2.imread(str(file_path))
-            img = self._enhance_image(img)
-            cv2.imwrite(str(file_path), img, [int(cv2.IMWRITE_JPEG_QUALITY), IMAGE_QUALITY])
+            # 4. Optimize image off the event loop, touching disk only for the final write
+            loop = asyncio.get_running_loop()
+            data, width, height = await loop.run_in_executor(self.process_pool, _cpu_pipeline, raw)
+            async with aiofiles.open(file_path, 'wb') as f:
+                await f.write(data)
             
-            # 4. Save metadata
+            # 5. Save metadata
             self._save_hash(phash)
+            reserved = None
             return DownloadedImage(
                 message_id=message.id,
                 channel=channel,
                 file_path=str(file_path.relative_to('data')),
-                phash=phash,
-                created_at=datetime.utcnow().isoformat(),
-                dimensions=f"{img.shape[1]}x{img.shape[0]}",  # width x height
-                file_size=os.path.getsize(file_path)
+                phash=f"{phash:016x}",
+                created_at=datetime.now(timezone.utc).isoformat(),
+                dimensions=f"{width}x{height}",
+                file_size=len(data)
+            )
             
         except Exception as e:
             logger.error(f"Failed processing image: {e}")
             if file_path.exists():
                 file_path.unlink()
             return None
-
-    def _enhance_image(self, img: np.ndarray) -> np.ndarray:
-        """Apply basic image enhancement"""
-        # Convert to LAB color space for better contrast enhancement
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
         
-        # CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        l = clahe.apply(l)
-        
-        # Merge channels and convert back to BGR
-        enhanced = cv2.merge((l,a,b))
-        return cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
+        finally:
+            if reserved is not None:
+                self.processed_hashes.discard(reserved)
+
+    async def _download_in_slot(self, message, channel: str) -> Optional[DownloadedImage]:
+        """Download one image, then hand its slot to the next waiting download"""
+        try:
+            return await self._download_image(message, channel)
+        finally:
+            self.download_slots.release()
 
     async def _process_channel(self, channel: str, limit: int = 200):
-        """Process all images from a channel"""
+        """Process all images from a channel, several downloads at a time"""
         logger.info(f"Processing channel: {channel}")
         entity = await self.client.get_entity(channel)
-        async for message in self.client.iter_messages(entity, limit=limit):
-            if isinstance(message.media, MessageMediaPhoto):
-                img_meta = await self._download_image(message, channel)
+        pending = set()
+        paging_error = None
+        try:
+            try:
+                async for message in self.client.iter_messages(entity, limit=limit):
+                    if isinstance(message.media, MessageMediaPhoto):
+                        # Slots are shared by all channels, so paging pauses while they are full
+                        await self.download_slots.acquire()
+                        pending.add(asyncio.ensure_future(self._download_in_slot(message, channel)))
+                    
+                    done = {task for task in pending if task.done()}
+                    pending -= done
+                    for task in done:
+                        img_meta = task.result()
+                        if img_meta:
+                            logger.success(f"Downloaded {img_meta.file_path}")
+                            yield img_meta
+            except Exception as e:
+                # Finish in-flight downloads first, so every persisted hash
+                # still has its metadata delivered
+                paging_error = e
+            
+            for task in asyncio.as_completed(pending):
+                img_meta = await task
                 if img_meta:
                     logger.success(f"Downloaded {img_meta.file_path}")
                     yield img_meta
+            
+            if paging_error is not None:
+                raise paging_error
+        
+        finally:
+            # Closed or cancelled early: never leave downloads running unobserved
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _drain_channel(self, channel: str):
+        """Consume every image a channel yields"""
+        async for img in self._process_channel(channel):
+            await self.metadata_queue.put(img)
+
+    def _connect_db(self):
+        """Open the metadata connection and create the table if needed"""
+        conn = psycopg2.connect(
+            dbname=os.getenv('POSTGRES_DB'),
+            user=os.getenv('POSTGRES_USER'),
+            password=os.getenv('POSTGRES_PASSWORD'),
+            host=os.getenv('POSTGRES_HOST'),
+            port=os.getenv('POSTGRES_PORT')
+        )
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE SCHEMA IF NOT EXISTS raw;
+                
+                CREATE TABLE IF NOT EXISTS raw.image_metadata (
+                    message_id BIGINT,
+                    channel VARCHAR(255),
+                    file_path VARCHAR(255),
+                    phash CHAR(16),
+                    created_at TIMESTAMP WITH TIME ZONE,
+                    dimensions VARCHAR(32),
+                    file_size INTEGER
+                );
+            """)
+        conn.commit()
+        return conn
+
+    def _copy_metadata(self, batch: List[DownloadedImage]):
+        """Write a batch of image metadata with a single COPY"""
+        buf = io.StringIO()
+        csv.writer(buf).writerows(astuple(img) for img in batch)
+        buf.seek(0)
+        try:
+            with self.db.cursor() as cur:
+                cur.copy_expert("""
+                    COPY raw.image_metadata
+                    (message_id, channel, file_path, phash, created_at, dimensions, file_size)
+                    FROM STDIN WITH (FORMAT CSV)
+                """, buf)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    async def _metadata_writer(self):
+        """Flush queued metadata every METADATA_BATCH items or METADATA_FLUSH_SECONDS"""
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            batch = []
+            deadline = loop.time() + METADATA_FLUSH_SECONDS
+            while len(batch) < METADATA_BATCH:
+                try:
+                    img = await asyncio.wait_for(self.metadata_queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if img is None:
+                    done = True
+                    break
+                batch.append(img)
+            
+            if batch:
+                try:
+                    await asyncio.to_thread(self._copy_metadata, batch)
+                except Exception as e:
+                    logger.error(f"Failed storing {len(batch)} image records: {e}")
 
     async def run(self, channels: List[str]):
         """Main execution flow"""
-        async with self.client:
-            tasks = [self._process_channel(ch) for ch in channels]
-            async for result in asyncio.as_completed(tasks):
-                async for img in await result:
-                    # Here you could add database insertion
-                    # or other post-processing
-                    pass
+        self.db = self._connect_db()
+        try:
+            async with self.client:
+                self.download_slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+                self.metadata_queue = asyncio.Queue()
+                writer = asyncio.create_task(self._metadata_writer())
+                results = await asyncio.gather(
+                    *(self._drain_channel(ch) for ch in channels),
+                    return_exceptions=True
+                )
+                for channel, result in zip(channels, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Channel {channel} failed: {result}")
+                await self.metadata_queue.put(None)
+                await writer
+        finally:
+            self.process_pool.shutdown()
+            self._hash_fp.close()
+            self.db.close()
 
 if __name__ == '__main__':
     downloader = AdvancedImageDownloader()
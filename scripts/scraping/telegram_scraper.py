@@ -14,19 +14,23 @@ Features:
 
 
 import os
-import json
+import orjson
 import asyncio
+import async_timeout
 import aiofiles
 import zipfile
-import io
+import shutil
+import sys
+import operator
 import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, List, Tuple
 import backoff
 import signal
 from loguru import logger
-from PIL import Image, ImageOps
 from telethon import TelegramClient, errors
 from telethon.tl.types import (
     Message,
@@ -37,7 +41,6 @@ from telethon.tl.types import (
 )
 from dotenv import load_dotenv
 import hashlib
-import zstandard as zstd
 
 # Quantum Configuration
 MAX_RETRIES = 7
@@ -46,8 +49,124 @@ SESSION_TIMEOUT = 120
 CHUNK_SIZE = 300  # Optimized batch size
 MAX_CONCURRENT_CHANNELS = 4  # Balanced concurrency
 IMAGE_QUALITY = 88  # Perfect quality/size ratio
+JPEG_SKIP_BYTES = 200 * 1024  # JPEGs below this are kept as downloaded
+MAX_IMAGE_DIMENSION = 1920  # Longest edge after optimization
+IMAGE_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP'}  # Re-encodable suffixes
 MAX_ZIP_SIZE = 250 * 1024 * 1024  # 250MB chunks for better reliability
+DOWNLOAD_PART_SIZE = 512 * 1024  # MTProto file part per request
+DOWNLOAD_STREAMS = 4  # Concurrent part requests per media file
+MEDIA_SLOTS_PER_CHANNEL = 2  # Concurrent media downloads per channel
+MESSAGE_QUEUE_SIZE = 64  # Messages buffered between history paging and processing
+QID_BYTES = 16  # blake2b message fingerprint size
+FLOOD_COOLDOWN = 60  # Seconds before a channel slot lost to FLOOD_WAIT is restored
 LOG_WIDTH = 120  # Terminal display optimization
+ZSTD_LEVEL = 10  # Message archive compression level
+ZIP_COPY_CHUNK = 1024 * 1024  # Bytes per read when streaming files into a package
+STORED_SUFFIXES = {'.zst', '.jpg', '.jpeg', '.webp', '.png', '.mp4', '.gz'}  # Already compressed
+
+def _write_compressed(path: Path, data: bytes, cctx, lock: threading.Lock):
+    """Stream-compress a message batch to disk; runs in a worker thread"""
+    with lock, open(path, 'wb') as f:
+        with cctx.stream_writer(f, size=len(data), closefd=False) as writer:
+            writer.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _optimize_sync(path_str: str, quality: int) -> Tuple[bool, int]:
+    """Re-encode an image in place; runs in a worker process"""
+    from PIL import Image  # Imported only in the image workers
+    
+    media_path = Path(path_str)
+    original_size = media_path.stat().st_size
+    optimized = False
+    saved = 0
+
+    # Re-encode in the source format so the suffix, package entry and
+    # stored path keep describing the file
+    fmt = IMAGE_FORMATS.get(media_path.suffix.lower())
+    if fmt is None:
+        return optimized, saved
+
+    # Telegram already serves small JPEGs near-optimally; re-encoding
+    # them costs a full decode and rarely saves bytes
+    if fmt == 'JPEG' and original_size < JPEG_SKIP_BYTES:
+        return optimized, saved
+
+    temp_path = media_path.with_name(f"{media_path.stem}.opt{media_path.suffix}")
+    try:
+        with Image.open(media_path) as img:
+            # Quantum downscale
+            img.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.LANCZOS)
+            transparent = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+            
+            # Quantum optimization, encoded straight to disk beside the original
+            if fmt == 'JPEG':
+                # Flatten transparency onto white
+                if transparent:
+                    img = img.convert('RGBA')
+                    background = Image.new('RGB', img.size, (255, 255, 255))
+                    background.paste(img, mask=img.getchannel('A'))
+                    img = background
+                elif img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.save(temp_path, format=fmt, quality=quality, optimize=True, progressive=True)
+            elif fmt == 'WEBP':
+                if img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGBA' if transparent else 'RGB')
+                img.save(temp_path, format=fmt, quality=quality, method=6)
+            else:
+                img.save(temp_path, format=fmt, optimize=True)
+        
+        # Keep the original unless re-encoding actually shrank it
+        new_size = temp_path.stat().st_size
+        if new_size < original_size:
+            temp_path.replace(media_path)
+            optimized = True
+            saved = original_size - new_size
+        else:
+            temp_path.unlink()
+    except Exception as e:
+        logger.warning(f"Quantum optimization skipped: {e}")
+        temp_path.unlink(missing_ok=True)
+
+    return optimized, saved
+
+def _photo_extension(media) -> str:
+    """Extension for photo media"""
+    return '.jpg'  # Default photo extension
+
+def _document_extension(media) -> str:
+    """Extension from a document's filename attribute"""
+    name = next(
+        (attr for attr in media.document.attributes if isinstance(attr, DocumentAttributeFilename)),
+        None
+    )
+    return Path(name.file_name).suffix.lower() if name else '.dat'
+
+def _expects_file(media) -> bool:
+    """Whether media carries a photo or document that should download to a file"""
+    if isinstance(media, MessageMediaPhoto):
+        return media.photo is not None
+    if isinstance(media, MessageMediaDocument):
+        return media.document is not None
+    return False
+
+_EXT_DISPATCH = {
+    MessageMediaPhoto: _photo_extension,
+    MessageMediaDocument: _document_extension
+}
+
+_ENTITY_TYPES = {}
+
+def _entity_type(cls) -> str:
+    """Entity class name, resolved once per class"""
+    name = _ENTITY_TYPES.get(cls)
+    if name is None:
+        name = _ENTITY_TYPES[cls] = cls.__name__
+    return name
+
+# Engagement inputs of a message, fetched in one C-level call
+_ENGAGEMENT_FIELDS = operator.attrgetter('views', 'forwards', 'replies')
 
 class QuantumTelegramScraper:
     """
@@ -87,6 +206,23 @@ class QuantumTelegramScraper:
         self.current_zip = None
         self.zip_counter = 1
         self.current_zip_size = 0
+        self._media_slots = {}
+        self._channel_hashers = {}
+        self._seen = {}
+        
+        # One multithreaded compressor shared by all flushes, built on first
+        # use; instances are not thread safe, so worker threads take turns
+        self._zstd = None
+        self._zstd_lock = threading.Lock()
+        
+        # Image re-encoding is CPU bound; keep it off the event loop and the GIL
+        self._img_pool = ProcessPoolExecutor(max_workers=max(2, (os.cpu_count() or 1) - 1))
+        
+        # Channel admission, created on the running loop
+        self._admission = None
+        self._active = 0
+        self._cmax = MAX_CONCURRENT_CHANNELS
+        self._restore_tasks = set()  # Strong refs; the loop only keeps weak ones
 
     def _load_config(self):
         """Load quantum-secured configuration"""
@@ -158,11 +294,12 @@ class QuantumTelegramScraper:
             # Start the watchdog monitor now that we have a running event loop
             watchdog_task = asyncio.create_task(self._watchdog_monitor())
             
-            # Quantum task scheduler
-            semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHANNELS)
+            # Quantum task scheduler; the cap shrinks on FLOOD_WAIT
+            self._admission = asyncio.Condition()
             
             async def quantum_task(channel_info):
-                async with semaphore:
+                await self._acquire_slot()
+                try:
                     channel = channel_info['name']
                     logger.info(f"🚀 Quantum acquisition initiated: {channel}")
                     start_time = time.monotonic()
@@ -173,23 +310,28 @@ class QuantumTelegramScraper:
                     status = "✅ COMPLETED" if success else "❌ FAILED"
                     logger.info(f"{status} {channel} in {duration}")
                     return success
+                finally:
+                    await self._release_slot()
 
-            # Execute quantum parallel processing
-            tasks = [quantum_task(ch) for ch in self.channels]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Cancel the watchdog task when done
-            watchdog_task.cancel()
             try:
-                await watchdog_task
-            except asyncio.CancelledError:
-                pass
+                # Execute quantum parallel processing
+                tasks = [quantum_task(ch) for ch in self.channels]
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                # Cancel the watchdog task when done
+                watchdog_task.cancel()
+                try:
+                    await watchdog_task
+                except asyncio.CancelledError:
+                    pass
             
             # Quantum result analysis
             success = sum(1 for r in results if r is True)
             logger.success(
                 f"QUANTUM MISSION SUMMARY: {success}/{len(results)} channels acquired"
             )
+            
+            self._img_pool.shutdown()
 
     async def _watchdog_monitor(self):
         """Quantum system integrity monitor"""
@@ -214,6 +356,7 @@ class QuantumTelegramScraper:
     async def _graceful_termination(self):
         """Quantum-safe shutdown sequence"""
         self._close_quantum_zip()
+        self._img_pool.shutdown(wait=False, cancel_futures=True)
         if self.client.is_connected():
             await self.client.disconnect()
         self._generate_quantum_report()
@@ -243,9 +386,7 @@ class QuantumTelegramScraper:
         ts = datetime.now().strftime('%Y%m%d_%H%M%S')
         zip_path = self.storage['zips'] / f"{channel}_{ts}_q{self.zip_counter}.zip"
         
-        self.current_zip = zipfile.ZipFile(
-            zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=9
-        )
+        self.current_zip = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED)
         self.current_zip_size = 0
         self.zip_counter += 1
         logger.info(f"Quantum package created: {zip_path.name}")
@@ -281,8 +422,17 @@ class QuantumTelegramScraper:
         if not self.current_zip or (self.current_zip_size + file_size > MAX_ZIP_SIZE):
             self._init_quantum_zip(arcname.split('_')[0])
 
+        # Deflate only what is not already compressed
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        if Path(arcname).suffix.lower() in STORED_SUFFIXES:
+            zinfo.compress_type = zipfile.ZIP_STORED
+        else:
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+
         try:
-            self.current_zip.write(file_path, arcname)
+            with open(file_path, 'rb') as src, \
+                    self.current_zip.open(zinfo, 'w', force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, length=ZIP_COPY_CHUNK)
             self.current_zip_size += file_size
             return True
         except Exception as e:
@@ -290,48 +440,64 @@ class QuantumTelegramScraper:
             return False
 
     async def _quantum_optimize_media(self, media_path: Path) -> Tuple[bool, int]:
-        """Neural media optimization pipeline"""
-        original_size = media_path.stat().st_size
-        optimized = False
-        saved = 0
-
-        try:
-            with Image.open(media_path) as img:
-                # Quantum format conversion
-                if img.format not in ('JPEG', 'WEBP'):
-                    img = img.convert('RGB')
-                
-                # Quantum optimization
-                buf = io.BytesIO()
-                img.save(
-                    buf,
-                    format='WEBP' if img.mode == 'RGB' else 'PNG',
-                    quality=IMAGE_QUALITY,
-                    method=6,
-                    lossless=False
-                )
-                
-                # Apply quantum compression
-                buf.seek(0)
-                with open(media_path, 'wb') as f:
-                    f.write(buf.getvalue())
-                
-                optimized = True
-                saved = original_size - media_path.stat().st_size
-        except Exception as e:
-            logger.warning(f"Quantum optimization skipped: {e}")
-
-        return optimized, saved
+        """Neural media optimization pipeline, run on the image process pool"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._img_pool, _optimize_sync, str(media_path), IMAGE_QUALITY
+        )
 
-    async def _download_quantum_media(self, message: Message, path: Path) -> bool:
+    async def _download_quantum_ranges(self, document, path: Path, size: int, progress_cb) -> None:
+        """Fetch a document as interleaved part streams written at their offsets"""
+        stride = DOWNLOAD_PART_SIZE * DOWNLOAD_STREAMS
+        received = 0
+        lock = asyncio.Lock()
+
+        async with aiofiles.open(path, 'wb') as f:
+            await f.truncate(size)
+
+            async def fetch(start: int):
+                nonlocal received
+                offset = start
+                async for chunk in self.client.iter_download(
+                    document,
+                    offset=start,
+                    stride=stride,
+                    limit=-(-(size - start) // stride),
+                    request_size=DOWNLOAD_PART_SIZE,
+                    file_size=size
+                ):
+                    async with lock:
+                        await f.seek(offset)
+                        await f.write(chunk)
+                        received += len(chunk)
+                        progress_cb(received, size)
+                    offset += stride
+
+            streams = [
+                asyncio.ensure_future(fetch(i * DOWNLOAD_PART_SIZE))
+                for i in range(DOWNLOAD_STREAMS)
+                if i * DOWNLOAD_PART_SIZE < size
+            ]
+            try:
+                await asyncio.gather(*streams)
+            except BaseException:
+                # Stop the sibling streams before the file handle closes
+                for stream in streams:
+                    stream.cancel()
+                await asyncio.gather(*streams, return_exceptions=True)
+                raise
+
+    async def _download_quantum_media(self, message: Message, path: Path, channel: str) -> bool:
         """Enhanced quantum media download with better performance tracking"""
-        path.parent.mkdir(parents=True, exist_ok=True)
         temp_path = path.with_name(f"{path.stem}.temp{path.suffix}")
         
         # Skip if file exists and is valid
-        if path.exists() and path.stat().st_size > 100:
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = -1
+        if size > 100:
             self.metrics['media'] += 1
-            self.metrics['data_volume'] += path.stat().st_size
+            self.metrics['data_volume'] += size
             return True
 
         try:
@@ -347,6 +513,7 @@ class QuantumTelegramScraper:
             def progress_cb(recvd, total):
                 nonlocal last_update
                 now = time.monotonic()
+                self.last_activity = now  # Long downloads still count as progress
                 if now - last_update > 1.0 or recvd == total:
                     elapsed = now - start_time
                     percent = (recvd / total) * 100
@@ -365,12 +532,13 @@ class QuantumTelegramScraper:
             
             for attempt in range(max_retries):
                 try:
-                    async with async_timeout.timeout(timeout):
-                        await self.client.download_media(
-                            message=message,
-                            file=temp_path,
-                            progress_callback=progress_cb if media_size else None
-                        )
+                    async with self._media_slots[channel], async_timeout.timeout(timeout):
+                        if media_size:
+                            await self._download_quantum_ranges(
+                                message.media.document, temp_path, media_size, progress_cb
+                            )
+                        else:
+                            await self.client.download_media(message=message, file=temp_path)
                         break
                 except (asyncio.TimeoutError, errors.TimeoutError):
                     if attempt == max_retries - 1:
@@ -378,27 +546,27 @@ class QuantumTelegramScraper:
                     await asyncio.sleep(2 ** attempt)
 
             # Validate download
-            if not temp_path.exists():
+            try:
+                size = temp_path.stat().st_size
+            except FileNotFoundError:
                 raise ValueError("Download failed - no file created")
                 
-            if temp_path.stat().st_size < 100:
-                raise ValueError(f"File too small ({temp_path.stat().st_size} bytes)")
+            if size < 100:
+                raise ValueError(f"File too small ({size} bytes)")
 
             # Atomic commit
-            if path.exists():
-                path.unlink()
-            temp_path.rename(path)
+            os.replace(temp_path, path)
             
             # Update metrics
             download_time = time.monotonic() - start_time
-            speed = (path.stat().st_size / 1024) / max(1, download_time)
+            speed = (size / 1024) / max(1, download_time)
             logger.success(
                 f"Downloaded {path.name} in {download_time:.1f}s "
                 f"({speed:.1f}KB/s)"
             )
             
             self.metrics['media'] += 1
-            self.metrics['data_volume'] += path.stat().st_size
+            self.metrics['data_volume'] += size
             return True
 
         except Exception as e:
@@ -417,10 +585,12 @@ class QuantumTelegramScraper:
         """Quantum message processing core"""
         try:
             # Quantum fingerprint
-            msg_hash = hashlib.blake2b(
-                f"{message.id}{channel}".encode(),
-                digest_size=16
-            ).hexdigest()
+            hasher = self._channel_hashers[channel].copy()
+            hasher.update(message.id.to_bytes(8, 'little'))
+            digest = hasher.digest()
+            if digest in self._seen[channel]:
+                return None
+            msg_hash = digest.hex()
 
             # Atomic message construction
             msg_data = {
@@ -447,26 +617,23 @@ class QuantumTelegramScraper:
 
     def _calculate_engagement(self, message: Message) -> float:
         """Quantum engagement scoring"""
-        views = getattr(message, 'views', 0) or 0
-        forwards = getattr(message, 'forwards', 0) or 0
-        replies = getattr(getattr(message, 'replies', None), 'replies', 0) or 0
-        return (views * 0.3 + forwards * 0.5 + replies * 0.2) / 100
+        views, forwards, replies = _ENGAGEMENT_FIELDS(message)
+        replies = replies.replies if replies else 0
+        return ((views or 0) * 0.3 + (forwards or 0) * 0.5 + (replies or 0) * 0.2) * 0.01
 
     def _extract_quantum_entities(self, message: Message) -> List[Dict]:
         """Quantum entity extraction"""
-        entities = []
-        if hasattr(message, 'entities') and message.entities:
-            for e in message.entities:
-                try:
-                    entity_text = message.text[e.offset:e.offset + e.length] if message.text else ""
-                    entities.append({
-                        'type': type(e).__name__,
-                        'text': entity_text,
-                        'position': [e.offset, e.length]
-                    })
-                except:
-                    continue
-        return entities
+        text = message.text or ''
+        end = len(text)
+        return [
+            {
+                'type': _entity_type(type(e)),
+                'text': text[e.offset:e.offset + e.length],
+                'position': [e.offset, e.length]
+            }
+            for e in getattr(message, 'entities', None) or ()
+            if 0 <= e.offset and e.offset + e.length <= end
+        ]
 
     async def _handle_quantum_media(self, message: Message, channel: str, msg_hash: str) -> Optional[Dict]:
         """Quantum media processing pipeline"""
@@ -481,7 +648,7 @@ class QuantumTelegramScraper:
             fpath = self.storage['media'] / fname
 
             # Quantum acquisition
-            if not await self._download_quantum_media(message, fpath):
+            if not await self._download_quantum_media(message, fpath, channel):
                 return None
 
             # Quantum optimization
@@ -511,43 +678,58 @@ class QuantumTelegramScraper:
 
     def _quantum_extension(self, media) -> str:
         """Quantum file type detection"""
-        if isinstance(media, MessageMediaPhoto):
-            return '.jpg'  # Default photo extension
-            
-        if isinstance(media, MessageMediaDocument):
-            for attr in media.document.attributes:
-                if isinstance(attr, DocumentAttributeFilename):
-                    return Path(attr.file_name).suffix.lower()
-        
-        return '.dat'
+        resolve = _EXT_DISPATCH.get(type(media))
+        return resolve(media) if resolve else '.dat'
+
+    def _compressor(self):
+        """Shared zstd compressor, imported and built on first flush"""
+        if self._zstd is None:
+            import zstandard as zstd
+            self._zstd = zstd.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+        return self._zstd
+
+    def _load_seen_qids(self, channel: str) -> set:
+        """Load digests of messages persisted by earlier runs"""
+        path = self.storage['indices'] / f"{channel}.qids.bin"
+        if not path.exists():
+            return set()
+        data = path.read_bytes()
+        return {data[i:i + QID_BYTES] for i in range(0, len(data) - QID_BYTES + 1, QID_BYTES)}
+
+    def _record_seen_qids(self, channel: str, digests: List[bytes]):
+        """Append digests of a durably persisted batch to the channel index"""
+        if not digests:
+            return
+        with open(self.storage['indices'] / f"{channel}.qids.bin", 'ab') as f:
+            f.write(b''.join(digests))
+        self._seen[channel].update(digests)
 
-    async def _save_quantum_messages(self, messages: List[Dict], channel: str, date: str):
-        """Quantum data persistence"""
+    async def _save_quantum_messages(self, messages: List[Dict], channel: str, day_dir: Path,
+                                     qids: List[bytes]):
+        """Quantum data persistence; each batch gets its own file so earlier ones are never overwritten"""
         if not messages:
             return
 
-        output_dir = self.storage['raw'] / date
-        output_dir.mkdir(exist_ok=True)
-        output_file = output_dir / f"{channel}.json.zst"
+        stamp = datetime.now().strftime('%H%M%S%f')
+        output_file = day_dir / f"{channel}_{stamp}.json.zst"
 
         # Quantum compression
         try:
             # Create temporary quantum buffer
             temp_file = output_file.with_suffix('.tmp')
             
-            # Serialize with quantum formatting
-            json_data = json.dumps(messages, ensure_ascii=False, separators=(',', ':'))
+            # Serialize straight to compact UTF-8
+            payload = orjson.dumps(messages)
             
-            # Apply quantum compression
-            cctx = zstd.ZstdCompressor(level=10)
-            with open(temp_file, 'wb') as f:
-                f.write(cctx.compress(json_data.encode('utf-8')))
+            # Apply quantum compression off the event loop
+            await asyncio.to_thread(_write_compressed, temp_file, payload, self._compressor(), self._zstd_lock)
             
             # Atomic commit
-            temp_file.rename(output_file)
+            os.replace(temp_file, output_file)
+            self._record_seen_qids(channel, qids)
             
             # Add to quantum package
-            self._add_to_quantum_package(output_file, f"messages/{channel}_{date}.json.zst")
+            self._add_to_quantum_package(output_file, f"messages/{channel}_{day_dir.name}_{stamp}.json.zst")
             
             logger.info(f"Quantum data stored: {output_file.name}")
 
@@ -560,6 +742,9 @@ class QuantumTelegramScraper:
         """Quantum channel acquisition protocol"""
         channel = channel_info['name']
         self.metrics['channels'][channel]['status'] = 'active'
+        self._media_slots[channel] = asyncio.Semaphore(MEDIA_SLOTS_PER_CHANNEL)
+        self._channel_hashers[channel] = hashlib.blake2b(channel.encode(), digest_size=QID_BYTES)
+        self._seen[channel] = self._load_seen_qids(channel)
         
         try:
             # Quantum entity resolution
@@ -571,33 +756,40 @@ class QuantumTelegramScraper:
             # Initialize quantum package
             self._init_quantum_zip(channel)
             
-            # Quantum message stream
-            today = datetime.now().strftime('%Y-%m-%d')
+            # Quantum message stream: one producer pages history while
+            # consumers download and process media concurrently
+            day_dir = self.storage['raw'] / datetime.now().strftime('%Y-%m-%d')
+            day_dir.mkdir(exist_ok=True)
             messages = []
+            qids = []  # Digests of batched messages that are safe to mark as seen
+            lock = asyncio.Lock()
+            queue = asyncio.Queue(maxsize=MESSAGE_QUEUE_SIZE)
+            workers = MAX_CONCURRENT_CHANNELS * 2
             
-            async for message in self.client.iter_messages(
-                entity,
-                limit=None,
-                wait_time=RATE_LIMIT_DELAY,
-                reverse=True
-            ):
-                processed = await self._process_quantum_message(message, channel)
-                if processed:
-                    messages.append(processed)
-                    
-                    # Quantum batch processing
-                    if len(messages) >= CHUNK_SIZE:
-                        await self._save_quantum_messages(messages, channel, today)
-                        messages = []
-                        self.last_activity = time.monotonic()
+            tasks = [asyncio.ensure_future(self._produce_messages(entity, queue, workers))]
+            tasks += [
+                asyncio.ensure_future(self._consume_messages(queue, channel, day_dir, messages, qids, lock))
+                for _ in range(workers)
+            ]
+            try:
+                # A failed producer still enqueues the sentinels, so consumers
+                # drain what was fetched before the error is handled
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                for task in tasks:
+                    task.cancel()
 
-            # Final quantum commit
+            # Final quantum commit, also when paging failed part way
             if messages:
-                await self._save_quantum_messages(messages, channel, today)
+                await self._save_quantum_messages(messages, channel, day_dir, qids)
             
             # Close quantum package
             self._close_quantum_zip()
             
+            error = next((r for r in results if isinstance(r, BaseException)), None)
+            if error is not None:
+                raise error
+            
             self.metrics['channels'][channel]['status'] = 'completed'
             return True
 
@@ -606,11 +798,110 @@ class QuantumTelegramScraper:
             self.metrics['channels'][channel]['status'] = 'failed'
             return False
 
+    async def _produce_messages(self, entity, queue: asyncio.Queue, consumers: int):
+        """Feed channel history into the queue, then one sentinel per consumer"""
+        last_id = 0
+        floods = 0
+        try:
+            while True:
+                try:
+                    async for message in self.client.iter_messages(
+                        entity,
+                        limit=None,
+                        min_id=last_id,  # Resume after the last enqueued message
+                        wait_time=0,  # Telethon sleeps through short FLOOD_WAITs itself
+                        reverse=True
+                    ):
+                        await queue.put(message)
+                        last_id = message.id
+                        floods = 0
+                    return
+                except errors.FloodWaitError as e:
+                    # Waits above flood_sleep_threshold surface here instead
+                    floods += 1
+                    if floods > MAX_RETRIES:
+                        raise
+                    self._on_flood_wait(None)
+                    logger.warning(f"FLOOD_WAIT {e.seconds}s while paging - resuming after message {last_id}")
+                    await self._flood_sleep(e.seconds)
+        finally:
+            for _ in range(consumers):
+                await queue.put(None)
+
+    async def _flood_sleep(self, seconds: int):
+        """Sleep out a FLOOD_WAIT while keeping the watchdog heartbeat alive"""
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self.last_activity = time.monotonic()
+            await asyncio.sleep(min(remaining, 30))
+
+    async def _consume_messages(self, queue: asyncio.Queue, channel: str, day_dir: Path,
+                                messages: List[Dict], qids: List[bytes], lock: asyncio.Lock):
+        """Process queued messages, flushing the shared batch every CHUNK_SIZE"""
+        while True:
+            message = await queue.get()
+            if message is None:
+                return
+
+            processed = await self._process_quantum_message(message, channel)
+            # Heartbeat for the watchdog, including messages skipped as already seen
+            self.last_activity = time.monotonic()
+            if processed:
+                async with lock:
+                    messages.append(processed)
+                    # A photo/document that failed to download stays unseen so the
+                    # next run retries it; previews, polls, geo etc. never yield a file
+                    if processed['media'] is not None or not _expects_file(message.media):
+                        qids.append(bytes.fromhex(processed['qid']))
+                    
+                    # Quantum batch processing
+                    if len(messages) >= CHUNK_SIZE:
+                        await self._save_quantum_messages(messages, channel, day_dir, qids)
+                        messages.clear()
+                        qids.clear()
+                        self.last_activity = time.monotonic()
+
+    async def _acquire_slot(self):
+        """Wait until fewer than _cmax channels are active, then claim a slot"""
+        async with self._admission:
+            await self._admission.wait_for(lambda: self._active < self._cmax)
+            self._active += 1
+
+    async def _release_slot(self):
+        """Free a channel slot and wake waiting channels"""
+        async with self._admission:
+            self._active -= 1
+            self._admission.notify_all()
+
+    def _on_flood_wait(self, details):
+        """Shrink channel concurrency while Telegram is rate limiting"""
+        error = sys.exc_info()[1]
+        if not isinstance(error, errors.FloodWaitError) or self._admission is None:
+            return
+        if self._cmax > 1:
+            self._cmax -= 1
+            logger.warning(f"FLOOD_WAIT {error.seconds}s - channel concurrency lowered to {self._cmax}")
+            task = asyncio.ensure_future(self._restore_slot(error.seconds))
+            self._restore_tasks.add(task)
+            task.add_done_callback(self._restore_tasks.discard)
+
+    async def _restore_slot(self, wait: int):
+        """Give back a channel slot once the flood wait has cooled down"""
+        await asyncio.sleep(max(wait, FLOOD_COOLDOWN))
+        async with self._admission:
+            self._cmax = min(MAX_CONCURRENT_CHANNELS, self._cmax + 1)
+            self._admission.notify_all()
+        logger.info(f"Channel concurrency restored to {self._cmax}")
+
     @backoff.on_exception(
         backoff.expo,
         (errors.FloodWaitError, errors.ServerError),
         max_tries=MAX_RETRIES,
-        jitter=backoff.full_jitter
+        jitter=backoff.full_jitter,
+        on_backoff=lambda details: details['args'][0]._on_flood_wait(details)
     )
     async def _get_quantum_entity(self, channel: str) -> Optional[Channel]:
         """Quantum entity resolution"""
@@ -624,37 +915,14 @@ class QuantumTelegramScraper:
             logger.error(f"Quantum access denied: {channel} - {e}")
             return None
 
-    async def run_quantum_acquisition(self):
-        """Orchestrate quantum data acquisition"""
-        async with self.client:
-            # Quantum task scheduler
-            semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHANNELS)
-            
-            async def quantum_task(channel_info):
-                async with semaphore:
-                    channel = channel_info['name']
-                    logger.info(f"🚀 Quantum acquisition initiated: {channel}")
-                    start_time = time.monotonic()
-                    
-                    success = await self._scrape_quantum_channel(channel_info)
-                    
-                    duration = timedelta(seconds=time.monotonic() - start_time)
-                    status = "✅ COMPLETED" if success else "❌ FAILED"
-                    logger.info(f"{status} {channel} in {duration}")
-                    return success
-
-            # Execute quantum parallel processing
-            tasks = [quantum_task(ch) for ch in self.channels]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Quantum result analysis
-            success = sum(1 for r in results if r is True)
-            logger.success(
-                f"QUANTUM MISSION SUMMARY: {success}/{len(results)} channels acquired"
-            )
-
 if __name__ == '__main__':
     # Quantum execution protocol
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass  # Default asyncio loop (e.g. on Windows)
+    
     scraper = QuantumTelegramScraper()
     
     try: